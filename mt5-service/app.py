@@ -8,11 +8,20 @@ Requirements:
 - Python with MetaTrader5 package
 
 Run: python app.py
+Without a terminal (in-memory simulator, see mt5_simulator.py): MT5_SIMULATOR=1 python app.py
 """
 
 import os
+import sys
+import copy
 import json
+import signal
+import time
+import threading
+import atexit
 from datetime import datetime
+from operator import itemgetter
+import numpy as np
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 from dotenv import load_dotenv
@@ -25,8 +34,72 @@ CORS(app, origins=os.getenv('CORS_ORIGINS', 'http://localhost:3000').split(','))
 # API Key for authentication
 API_KEY = os.getenv('MT5_SERVICE_API_KEY', 'mt5-service-secret-key')
 
+# In-memory terminal instead of MetaTrader5 (local development and tests, any OS)
+simulator = None
+if os.getenv('MT5_SIMULATOR', 'false').lower() in ('1', 'true'):
+    from mt5_simulator import Simulator
+    simulator = Simulator()
+
 # Store active connections
 active_connections = {}
+# Last-known connection table; unlike active_connections it survives /shutdown
+known_connections = {}
+
+# Last-known account data and symbol catalog, persisted for warm starts
+account_snapshots = {}
+symbol_catalog = {'symbols': [], 'updated_at': None}
+session = {'connection_id': None}
+# Guards the persisted structures while save_state copies them, and the state file itself
+# (reentrant: the SIGTERM handler may interrupt a holder on the main thread)
+state_lock = threading.RLock()
+STATE_FILE = os.getenv('MT5_STATE_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mt5_state.json'))
+STATE_SAVE_INTERVAL = float(os.getenv('MT5_STATE_SAVE_INTERVAL', 60))
+WARMUP_RETRY_INTERVAL = float(os.getenv('MT5_WARMUP_RETRY_INTERVAL', 5))
+
+# Terminal warm-up progress, reported by /ready
+readiness = {'ready': False, 'stage': 'not_started', 'error': None, 'warnings': [],
+             'started_at': None, 'completed_at': None}
+WARMUP_ATTEMPTS = int(os.getenv('MT5_WARMUP_ATTEMPTS', 3))
+
+# Cache symbol contract data and per-lot margin estimates
+symbol_cache = {}
+margin_cache = {}
+tick_value_cache = {}
+symbol_limits_cache = {}
+SYMBOL_LIMITS_TTL = float(os.getenv('MT5_SYMBOL_LIMITS_TTL', 60))
+MARGIN_CACHE_TTL = float(os.getenv('MT5_MARGIN_CACHE_TTL', 30))
+# Relative price move that invalidates cached margin / tick value results
+QUOTE_PRICE_THRESHOLD = float(os.getenv('MT5_QUOTE_PRICE_THRESHOLD', 0.002))
+
+# Cached deal history and derived analytics per account
+analytics_cache = {}
+analytics_lock = threading.Lock()
+# Epoch seconds: the MT5 API reads naive datetimes as UTC, so epochs avoid
+# shifting the window by the host's UTC offset
+ANALYTICS_HISTORY_START = 946684800  # 2000-01-01 UTC
+# Deal times are in broker server time, often hours ahead of UTC
+ANALYTICS_FETCH_AHEAD = 2 * 86400
+ANALYTICS_MAX_POINTS = 5000
+# Distinct ?points= results kept per account
+ANALYTICS_RESULTS_CACHE = 8
+
+# Server-side stop management rules, keyed by (connection_id, 'ticket', n) or
+# (connection_id, 'magic', n); only the logged-in account's rules are evaluated
+stop_rules = {}
+stop_rules_lock = threading.Lock()
+stop_engine = {'thread': None, 'version': 0, 'account': None, 'evaluations': 0, 'modifications': 0, 'closes': 0, 'last_error': None}
+STOP_ENGINE_INTERVAL = float(os.getenv('MT5_STOP_ENGINE_INTERVAL', 0.05))
+STOP_RATE_PER_SYMBOL = float(os.getenv('MT5_STOP_RATE_PER_SYMBOL', 5))
+
+# Rule parameters (distances in points, max_duration in seconds) and their defaults
+STOP_RULE_DEFAULTS = {
+    'trailing_distance': np.nan,
+    'trailing_step': 0.0,
+    'trailing_start': 0.0,
+    'break_even_trigger': np.nan,
+    'break_even_offset': 0.0,
+    'max_duration': np.nan,
+}
 
 def require_api_key(f):
     """Decorator to require API key authentication"""
@@ -41,7 +114,9 @@ def require_api_key(f):
 
 
 def get_mt5():
-    """Import MetaTrader5 module"""
+    """Import MetaTrader5 module (or the simulator when MT5_SIMULATOR is set)"""
+    if simulator is not None:
+        return simulator
     try:
         import MetaTrader5 as mt5
         return mt5
@@ -49,6 +124,849 @@ def get_mt5():
         return None
 
 
+def get_symbol_meta(mt5, symbol):
+    """Get cached contract data for a symbol"""
+    meta = symbol_cache.get(symbol)
+    if meta is None:
+        info = mt5.symbol_info(symbol)
+        if info is None:
+            return None
+        meta = {
+            'currency_base': info.currency_base,
+            'currency_profit': info.currency_profit,
+            'contract_size': info.trade_contract_size,
+            'digits': info.digits,
+            'point': info.point,
+            'tick_size': info.trade_tick_size,
+        }
+        with state_lock:
+            symbol_cache[symbol] = meta
+    return meta
+
+
+def get_symbol_limits(mt5, symbol):
+    """Get trading limits for a symbol, refreshed every SYMBOL_LIMITS_TTL seconds.
+
+    Unlike contract data, brokers can change these at any time (e.g. close-only).
+    """
+    entry = symbol_limits_cache.get(symbol)
+    now = time.monotonic()
+    if entry and now - entry['time'] < SYMBOL_LIMITS_TTL:
+        return entry['limits']
+
+    info = mt5.symbol_info(symbol)
+    if info is None:
+        return None
+    limits = {
+        'visible': info.visible,
+        'trade_mode': info.trade_mode,
+        'volume_min': info.volume_min,
+        'volume_max': info.volume_max,
+        'volume_step': info.volume_step,
+        'stops_level': info.trade_stops_level,
+    }
+    symbol_limits_cache[symbol] = {'limits': limits, 'time': now}
+    return limits
+
+
+def cached_calc(cache, key, price, compute):
+    """Get a cached price-dependent result, recomputing it when it expires or the price moves"""
+    entry = cache.get(key)
+    now = time.monotonic()
+    if (entry and now - entry['time'] < MARGIN_CACHE_TTL
+            and abs(price - entry['price']) <= entry['price'] * QUOTE_PRICE_THRESHOLD):
+        return entry['value']
+
+    value = compute()
+    if value is not None:
+        cache[key] = {'value': value, 'price': price, 'time': now}
+    return value
+
+
+def get_margin(mt5, symbol, side, volume, price):
+    """Get cached margin for a symbol/side/volume bucket (side: 0 = buy, 1 = sell)"""
+    order_type = mt5.ORDER_TYPE_BUY if side == 0 else mt5.ORDER_TYPE_SELL
+    return cached_calc(margin_cache, (symbol, side, round(volume, 8)), price,
+                       lambda: mt5.order_calc_margin(order_type, symbol, volume, float(price)))
+
+
+def get_tick_value(mt5, symbol, price):
+    """Get cached tick value (in account currency) for a symbol"""
+    def compute():
+        info = mt5.symbol_info(symbol)
+        return info.trade_tick_value if info else None
+    return cached_calc(tick_value_cache, symbol, price, compute)
+
+
+# NumPy dtypes for position columns
+POSITION_DTYPES = {
+    'ticket': np.int64,
+    'symbol': str,
+    'type': np.int8,
+    'volume': np.float64,
+    'price_open': np.float64,
+    'price_current': np.float64,
+    'sl': np.float64,
+    'tp': np.float64,
+    'profit': np.float64,
+    'swap': np.float64,
+    'time': np.int64,
+    'magic': np.int64,
+}
+
+
+# NumPy dtypes for deal columns
+DEAL_DTYPES = {
+    'ticket': np.int64,
+    'time': np.int64,
+    'type': np.int8,
+    'entry': np.int8,
+    'magic': np.int64,
+    'position_id': np.int64,
+    'volume': np.float64,
+    'price': np.float64,
+    'commission': np.float64,
+    'swap': np.float64,
+    'profit': np.float64,
+    'symbol': str,
+}
+
+
+def records_to_arrays(records, dtypes, fields=None):
+    """Load MT5 records (named tuples) into columnar NumPy arrays.
+
+    Only the requested fields are converted; each numeric column is read with
+    np.fromiter straight from the tuples instead of transposing every field.
+    """
+    fields = fields or dtypes.keys()
+    index = {name: i for i, name in enumerate(records[0]._fields)}
+    arrays = {}
+    for f in fields:
+        values = map(itemgetter(index[f]), records)
+        if dtypes[f] is str:
+            arrays[f] = np.array(list(values), dtype=str)
+        else:
+            arrays[f] = np.fromiter(values, dtype=dtypes[f], count=len(records))
+    return arrays
+
+
+def factorize_field(records, field):
+    """Sorted unique values of a string field and each record's code into them"""
+    i = records[0]._fields.index(field)
+    values = list(map(itemgetter(i), records))
+    labels = sorted(set(values))
+    codes = dict(zip(labels, range(len(labels))))
+    return np.array(labels, dtype=str), np.fromiter(map(codes.__getitem__, values), dtype=np.intp, count=len(values))
+
+
+def positions_to_arrays(positions, fields=None):
+    """Load positions into columnar NumPy arrays (only the requested fields)"""
+    return records_to_arrays(positions, POSITION_DTYPES, fields)
+
+
+def group_sum(keys, *values):
+    """Sum each value array per unique key"""
+    labels, inverse = np.unique(keys, return_inverse=True)
+    sums = [np.bincount(inverse, weights=v, minlength=len(labels)) for v in values]
+    return labels, inverse, sums
+
+
+def compute_portfolio(mt5, positions):
+    """Compute exposure, profit and margin breakdowns for a set of positions"""
+    cols = positions_to_arrays(positions, ('type', 'volume', 'price_current', 'profit', 'swap', 'magic'))
+    symbols, sym_idx = factorize_field(positions, 'symbol')
+
+    # Per-symbol contract data (one lookup per unique symbol, cached)
+    metas = [get_symbol_meta(mt5, s) or {} for s in symbols]
+    contract_size = np.array([m.get('contract_size', 1.0) for m in metas], dtype=np.float64)
+    currency_base = np.array([m.get('currency_base', '') for m in metas], dtype=str)
+    currency_profit = np.array([m.get('currency_profit', '') for m in metas], dtype=str)
+
+    volume = cols['volume']
+    price = cols['price_current']
+    is_buy = cols['type'] == 0
+    signed_volume = np.where(is_buy, volume, -volume)
+    units = signed_volume * contract_size[sym_idx]
+
+    # Margin estimates from cached per-lot margin at the average current price
+    counts = np.bincount(sym_idx, minlength=len(symbols))
+    avg_price = np.bincount(sym_idx, weights=price, minlength=len(symbols)) / counts
+    margin_buy = np.array([get_margin(mt5, s, 0, 1.0, p) or 0.0 for s, p in zip(symbols, avg_price)])
+    margin_sell = np.array([get_margin(mt5, s, 1, 1.0, p) or 0.0 for s, p in zip(symbols, avg_price)])
+    margin = volume * np.where(is_buy, margin_buy[sym_idx], margin_sell[sym_idx])
+
+    n = len(symbols)
+    net_volume = np.bincount(sym_idx, weights=signed_volume, minlength=n)
+    gross_volume = np.bincount(sym_idx, weights=volume, minlength=n)
+    net_units = np.bincount(sym_idx, weights=units, minlength=n)
+    gross_units = np.bincount(sym_idx, weights=np.abs(units), minlength=n)
+    symbol_profit = np.bincount(sym_idx, weights=cols['profit'], minlength=n)
+    symbol_swap = np.bincount(sym_idx, weights=cols['swap'], minlength=n)
+    symbol_margin = np.bincount(sym_idx, weights=margin, minlength=n)
+
+    # Currency exposure: long base / short quote for buys, reverse for sells.
+    # Aggregated per symbol first so currency grouping only touches unique symbols.
+    # When base == quote (index and stock CFDs) the base leg is a unit count,
+    # not money, so only the quote notional (long for buys) is reported.
+    quote_units = -units * price
+    net_quote = np.bincount(sym_idx, weights=quote_units, minlength=n)
+    gross_quote = np.bincount(sym_idx, weights=np.abs(quote_units), minlength=n)
+    same_currency = currency_base == currency_profit
+    net_quote = np.where(same_currency, -net_quote, net_quote)
+    currencies, _, (currency_net, currency_gross) = group_sum(
+        np.concatenate([currency_base[~same_currency], currency_profit]),
+        np.concatenate([net_units[~same_currency], net_quote]),
+        np.concatenate([gross_units[~same_currency], gross_quote]),
+    )
+
+    magics, magic_idx, (magic_profit, magic_volume) = group_sum(cols['magic'], cols['profit'], volume)
+    magic_count = np.bincount(magic_idx, minlength=len(magics))
+
+    return {
+        'count': int(len(volume)),
+        'totals': {
+            'volume': float(volume.sum()),
+            'net_volume': float(signed_volume.sum()),
+            'profit': float(cols['profit'].sum()),
+            'swap': float(cols['swap'].sum()),
+            'margin': float(margin.sum()),
+        },
+        'symbols': [{
+            'symbol': str(symbols[i]),
+            'positions': int(counts[i]),
+            'net_volume': float(net_volume[i]),
+            'gross_volume': float(gross_volume[i]),
+            'net_exposure': float(net_units[i]),
+            'gross_exposure': float(gross_units[i]),
+            'profit': float(symbol_profit[i]),
+            'swap': float(symbol_swap[i]),
+            'margin': float(symbol_margin[i]),
+        } for i in range(n)],
+        'currencies': [{
+            'currency': str(currencies[i]),
+            'net_exposure': float(currency_net[i]),
+            'gross_exposure': float(currency_gross[i]),
+        } for i in range(len(currencies)) if currencies[i]],
+        'magics': [{
+            'magic': int(magics[i]),
+            'positions': int(magic_count[i]),
+            'volume': float(magic_volume[i]),
+            'profit': float(magic_profit[i]),
+        } for i in range(len(magics))],
+    }
+
+
+def update_deal_history(mt5, key):
+    """Fetch deals newer than the cached history for an account and append them"""
+    state = analytics_cache.get(key)
+    if state is None:
+        state = {'deals': None, 'last_time': None, 'tickets': set(), 'results': {}}
+        analytics_cache[key] = state
+
+    date_from = state['last_time'] if state['last_time'] is not None else ANALYTICS_HISTORY_START
+    deals = mt5.history_deals_get(date_from, int(time.time()) + ANALYTICS_FETCH_AHEAD)
+    if deals:
+        # The range is inclusive, so drop anything already cached
+        deals = [d for d in deals if d.ticket not in state['tickets']]
+    if not deals:
+        return state
+
+    new = records_to_arrays(deals, DEAL_DTYPES)
+    order = np.argsort(new['time'], kind='stable')
+    new = {f: col[order] for f, col in new.items()}
+
+    if state['deals'] is None:
+        state['deals'] = new
+    else:
+        state['deals'] = {f: np.concatenate([state['deals'][f], new[f]]) for f in new}
+
+    state['tickets'].update(new['ticket'].tolist())
+    state['last_time'] = max(int(new['time'][-1]), state['last_time'] or 0)
+    state['results'] = {}
+    return state
+
+
+def profit_factor(gross_profit, gross_loss):
+    """Gross profit over gross loss (None when there are no losing trades)"""
+    return float(gross_profit / gross_loss) if gross_loss > 0 else None
+
+
+def group_trade_stats(keys, net):
+    """Per-key trade count, net profit, win rate and profit factor"""
+    wins = net > 0
+    labels, inverse, (total, win_count, gross_profit, gross_loss) = group_sum(
+        keys, net, wins.astype(np.float64), np.where(wins, net, 0.0), np.where(net < 0, -net, 0.0))
+    trades = np.bincount(inverse, minlength=len(labels))
+    return [{
+        'key': labels[i].item(),
+        'trades': int(trades[i]),
+        'net_profit': float(total[i]),
+        'win_rate': float(win_count[i] / trades[i] * 100),
+        'profit_factor': profit_factor(gross_profit[i], gross_loss[i]),
+    } for i in range(len(labels))]
+
+
+def compute_trade_analytics(mt5, deals, points=500):
+    """Compute balance curve, drawdown and trade statistics from deal arrays"""
+    net = deals['profit'] + deals['commission'] + deals['swap']
+    is_trade = deals['type'] <= mt5.DEAL_TYPE_SELL
+
+    # Balance curve over all deals; drawdown over trading P/L only so that
+    # deposits and withdrawals do not register as gains or losses
+    balance = np.cumsum(net)
+    pnl = np.cumsum(np.where(is_trade, net, 0.0))
+    peak = np.maximum.accumulate(pnl)
+    drawdown = peak - pnl
+    dd_idx = int(np.argmax(drawdown))
+    peak_idx = int(np.argmax(pnl[:dd_idx + 1]))
+    peak_balance = balance[peak_idx]
+    max_drawdown = float(drawdown[dd_idx])
+
+    # A trade is a position with at least one closing deal; its result
+    # includes entry-side commission and swap
+    trade_deals = np.flatnonzero(is_trade)
+    positions, first, inverse = np.unique(
+        deals['position_id'][trade_deals], return_index=True, return_inverse=True)
+    closing = (deals['entry'][trade_deals] != mt5.DEAL_ENTRY_IN).astype(np.float64)
+    closed = np.bincount(inverse, weights=closing, minlength=len(positions)) > 0
+    trade_net = np.bincount(inverse, weights=net[trade_deals], minlength=len(positions))[closed]
+    trade_symbol = deals['symbol'][trade_deals][first][closed]
+    trade_magic = deals['magic'][trade_deals][first][closed]
+
+    wins = trade_net[trade_net > 0]
+    losses = trade_net[trade_net < 0]
+    gross_profit = float(wins.sum())
+    gross_loss = float(-losses.sum())
+    total_trades = int(len(trade_net))
+
+    sample = np.unique(np.linspace(0, len(balance) - 1, min(points, len(balance))).astype(np.int64))
+    times = deals['time']
+
+    return {
+        'deals_count': int(len(net)),
+        'total_trades': total_trades,
+        'net_profit': float(trade_net.sum()),
+        'gross_profit': gross_profit,
+        'gross_loss': gross_loss,
+        'win_rate': float(len(wins) / total_trades * 100) if total_trades else 0,
+        'profit_factor': profit_factor(gross_profit, gross_loss),
+        'average_win': float(wins.mean()) if len(wins) else 0,
+        'average_loss': float(losses.mean()) if len(losses) else 0,
+        'largest_win': float(wins.max()) if len(wins) else 0,
+        'largest_loss': float(losses.min()) if len(losses) else 0,
+        'expectancy': float(trade_net.mean()) if total_trades else 0,
+        'max_drawdown': max_drawdown,
+        'max_drawdown_pct': float(max_drawdown / peak_balance * 100) if peak_balance > 0 else 0,
+        'max_drawdown_time': datetime.fromtimestamp(int(times[dd_idx])).isoformat(),
+        'balance': float(balance[-1]),
+        'balance_curve': [{
+            'time': datetime.fromtimestamp(int(times[i])).isoformat(),
+            'balance': float(balance[i]),
+        } for i in sample],
+        'by_symbol': [{'symbol': s.pop('key'), **s} for s in group_trade_stats(trade_symbol, trade_net)],
+        'by_magic': [{'magic': s.pop('key'), **s} for s in group_trade_stats(trade_magic, trade_net)],
+    }
+
+
+def build_open_request(mt5, symbol, trade_type, volume, price, sl=None, tp=None,
+                       magic=123456, comment='AU-Next Trade'):
+    """Build a market order request"""
+    request_dict = {
+        'action': mt5.TRADE_ACTION_DEAL,
+        'symbol': symbol,
+        'volume': volume,
+        'type': trade_type,
+        'price': price,
+        'deviation': 20,
+        'magic': magic,
+        'comment': comment,
+        'type_time': mt5.ORDER_TIME_GTC,
+        'type_filling': mt5.ORDER_FILLING_IOC,
+    }
+
+    if sl:
+        request_dict['sl'] = float(sl)
+    if tp:
+        request_dict['tp'] = float(tp)
+    return request_dict
+
+
+def validate_order(mt5, meta, limits, side, volume, bid, ask, sl, tp):
+    """Check an order against cached contract data and limits without calling the terminal"""
+    errors = []
+    mode = limits['trade_mode']
+    if mode in (mt5.SYMBOL_TRADE_MODE_DISABLED, mt5.SYMBOL_TRADE_MODE_CLOSEONLY):
+        errors.append('Trading is disabled for this symbol')
+    elif mode == mt5.SYMBOL_TRADE_MODE_LONGONLY and side == 1:
+        errors.append('Only buy orders are allowed for this symbol')
+    elif mode == mt5.SYMBOL_TRADE_MODE_SHORTONLY and side == 0:
+        errors.append('Only sell orders are allowed for this symbol')
+
+    if volume < limits['volume_min'] or volume > limits['volume_max']:
+        errors.append(f"volume must be between {limits['volume_min']} and {limits['volume_max']}")
+    elif limits['volume_step'] and abs(volume / limits['volume_step'] - round(volume / limits['volume_step'])) > 1e-6:
+        errors.append(f"volume must be a multiple of {limits['volume_step']}")
+
+    # SL/TP must sit on the right side of the price that closes the position
+    # (bid for buys, ask for sells), at least stops_level points away
+    direction = 1 if side == 0 else -1
+    price = bid if side == 0 else ask
+    # Distances are compared in points, rounded to absorb float noise at the boundary
+    if sl and round((price - sl) * direction / meta['point'], 6) < limits['stops_level']:
+        errors.append(f'sl must be at least {limits["stops_level"]} points {"below" if side == 0 else "above"} the {"bid" if side == 0 else "ask"}')
+    if tp and round((tp - price) * direction / meta['point'], 6) < limits['stops_level']:
+        errors.append(f'tp must be at least {limits["stops_level"]} points {"above" if side == 0 else "below"} the {"bid" if side == 0 else "ask"}')
+    return errors
+
+
+def build_close_request(mt5, position, tick, comment='AU-Next Close'):
+    """Build the opposite market order that closes a position"""
+    if position.type == 0:  # Buy position
+        trade_type = mt5.ORDER_TYPE_SELL
+        price = tick.bid
+    else:  # Sell position
+        trade_type = mt5.ORDER_TYPE_BUY
+        price = tick.ask
+
+    return {
+        'action': mt5.TRADE_ACTION_DEAL,
+        'symbol': position.symbol,
+        'volume': position.volume,
+        'type': trade_type,
+        'position': int(position.ticket),
+        'price': price,
+        'deviation': 20,
+        'magic': 123456,
+        'comment': comment,
+        'type_time': mt5.ORDER_TIME_GTC,
+        'type_filling': mt5.ORDER_FILLING_IOC,
+    }
+
+
+def evaluate_stop_rules(cols, price, point, tick_size, stops_level, params, now):
+    """Vectorized trailing-stop, break-even and time-exit evaluation.
+
+    Returns the new SL per position plus masks of positions to modify and close.
+    """
+    direction = np.where(cols['type'] == 0, 1.0, -1.0)
+    profit_points = (price - cols['price_open']) * direction / point
+
+    # Levels are compared in "favourable" space (price * direction) so that a
+    # higher value is a tighter stop for both buys and sells. Candidates are
+    # aligned down to the symbol's tick size, away from the price.
+    current = np.where(cols['sl'] > 0, cols['sl'] * direction, -np.inf)
+    candidate = current.copy()
+
+    # The terminal rejects stops closer than stops_level points to the price,
+    # so such candidates are dropped instead of being retried every tick
+    limit = price * direction - np.maximum(stops_level, 1) * point
+
+    break_even = profit_points >= params['break_even_trigger']
+    be_level = cols['price_open'] * direction + params['break_even_offset'] * point
+    be_level = np.floor(be_level / tick_size + 1e-9) * tick_size
+    break_even &= be_level <= limit
+    candidate = np.where(break_even, np.maximum(candidate, be_level), candidate)
+
+    trailing = ~np.isnan(params['trailing_distance']) & (profit_points >= params['trailing_start'])
+    trail_level = price * direction - params['trailing_distance'] * point
+    trail_level = np.floor(trail_level / tick_size + 1e-9) * tick_size
+    trailing &= trail_level <= limit
+    candidate = np.where(trailing, np.maximum(candidate, trail_level), candidate)
+
+    # No stop and no triggered rule leaves both at -inf (inf - inf is nan, i.e. no modify)
+    with np.errstate(invalid='ignore'):
+        modify = candidate - current >= np.maximum(params['trailing_step'] * point, tick_size)
+    close = now - cols['time'] >= params['max_duration']
+    new_sl = candidate * direction
+    return new_sl, modify & ~close, close
+
+
+def current_connection_id(mt5):
+    """Connection id (account@server) of the account the terminal is logged into"""
+    account_info = mt5.account_info()
+    if account_info is None:
+        return None
+    return f"{account_info.login}@{account_info.server}"
+
+
+def process_stop_rules(mt5, rules, last_ticks, pending, buckets):
+    """Evaluate the logged-in account's rules for positions whose symbol has a new tick"""
+    connection_id = current_connection_id(mt5)
+    if connection_id is None:
+        return
+
+    # After an account switch, nothing queued for the previous account may be sent
+    if connection_id != stop_engine['account']:
+        stop_engine['account'] = connection_id
+        pending.clear()
+        last_ticks.clear()
+
+    rules = {(kind, target): rule for (conn, kind, target), rule in rules.items() if conn == connection_id}
+    if not rules:
+        return
+
+    positions = mt5.positions_get()
+    if positions is None:
+        return
+
+    # Ticket rules end with their position (only this account's)
+    open_tickets = {p.ticket for p in positions}
+    with stop_rules_lock:
+        for key in [k for k in stop_rules
+                    if k[0] == connection_id and k[1] == 'ticket' and k[2] not in open_tickets]:
+            del stop_rules[key]
+    for ticket in [t for t in pending if t not in open_tickets]:
+        del pending[ticket]
+
+    managed, managed_rules = [], []
+    for pos in positions:
+        rule = rules.get(('ticket', pos.ticket)) or rules.get(('magic', pos.magic))
+        if rule:
+            managed.append(pos)
+            managed_rules.append(rule)
+
+    if managed:
+        cols = positions_to_arrays(managed, ('ticket', 'symbol', 'type', 'price_open', 'sl', 'tp', 'time'))
+        symbols, sym_idx = np.unique(cols['symbol'], return_inverse=True)
+
+        bid = np.full(len(symbols), np.nan)
+        ask = np.full(len(symbols), np.nan)
+        point = np.ones(len(symbols))
+        tick_size = np.ones(len(symbols))
+        digits = [0] * len(symbols)
+        stops_level = np.zeros(len(symbols))
+        tick_time = np.zeros(len(symbols))
+        ticked = np.zeros(len(symbols), dtype=bool)
+        for i, symbol in enumerate(symbols):
+            tick = mt5.symbol_info_tick(symbol)
+            meta = get_symbol_meta(mt5, symbol)
+            limits = get_symbol_limits(mt5, symbol)
+            if tick is None or meta is None or limits is None:
+                continue
+            bid[i], ask[i], point[i], tick_time[i] = tick.bid, tick.ask, meta['point'], tick.time
+            tick_size[i] = meta['tick_size'] or meta['point']
+            digits[i] = meta['digits']
+            stops_level[i] = limits['stops_level']
+            ticked[i] = last_ticks.get(symbol) != tick.time_msc
+            last_ticks[symbol] = tick.time_msc
+
+        active = ticked[sym_idx]
+        if active.any():
+            params = {f: np.array([r.get(f, d) for r in managed_rules], dtype=np.float64)
+                      for f, d in STOP_RULE_DEFAULTS.items()}
+            price = np.where(cols['type'] == 0, bid[sym_idx], ask[sym_idx])
+            new_sl, modify, close = evaluate_stop_rules(
+                cols, price, point[sym_idx], tick_size[sym_idx], stops_level[sym_idx],
+                params, tick_time[sym_idx])
+            stop_engine['evaluations'] += 1
+
+            for i in np.flatnonzero(close & active):
+                pending.pop(managed[i].ticket, None)
+                tick = mt5.symbol_info_tick(managed[i].symbol)
+                result = mt5.order_send(build_close_request(mt5, managed[i], tick, 'AU-Next Time Exit'))
+                if result is None or result.retcode != mt5.TRADE_RETCODE_DONE:
+                    stop_engine['last_error'] = f'Close {managed[i].ticket} failed: {getattr(result, "comment", mt5.last_error())}'
+                else:
+                    stop_engine['closes'] += 1
+
+            # Coalesce: only the latest SL per ticket is kept until it can be sent
+            for i in np.flatnonzero(modify & active):
+                pending[managed[i].ticket] = {
+                    'symbol': managed[i].symbol,
+                    'sl': round(float(new_sl[i]), digits[sym_idx[i]]),
+                    'tp': managed[i].tp,
+                }
+
+    flush_stop_modifications(mt5, pending, buckets)
+
+
+def flush_stop_modifications(mt5, pending, buckets):
+    """Send pending SL/TP updates, rate limited per symbol (token bucket)"""
+    now = time.monotonic()
+    for ticket, mod in list(pending.items()):
+        # Capacity of at least one token so rates below 1/s still send
+        capacity = max(1.0, STOP_RATE_PER_SYMBOL)
+        bucket = buckets.setdefault(mod['symbol'], [capacity, now])
+        bucket[0] = min(capacity, bucket[0] + (now - bucket[1]) * STOP_RATE_PER_SYMBOL)
+        bucket[1] = now
+        if bucket[0] < 1:
+            continue
+        bucket[0] -= 1
+        del pending[ticket]
+
+        result = mt5.order_send({
+            'action': mt5.TRADE_ACTION_SLTP,
+            'symbol': mod['symbol'],
+            'position': int(ticket),
+            'sl': mod['sl'],
+            'tp': mod['tp'],
+        })
+        if result is None or result.retcode != mt5.TRADE_RETCODE_DONE:
+            stop_engine['last_error'] = f'Modify {ticket} failed: {getattr(result, "comment", mt5.last_error())}'
+        else:
+            stop_engine['modifications'] += 1
+
+
+def run_stop_engine():
+    """Background loop driving the stop rules from the tick stream"""
+    last_ticks, pending, buckets = {}, {}, {}
+    version = None
+    while True:
+        with stop_rules_lock:
+            rules = dict(stop_rules)
+            # Changed rules are evaluated right away instead of on the next tick
+            if version != stop_engine['version']:
+                version = stop_engine['version']
+                last_ticks.clear()
+        mt5 = get_mt5()
+        if rules and mt5:
+            try:
+                process_stop_rules(mt5, rules, last_ticks, pending, buckets)
+            except Exception as e:
+                stop_engine['last_error'] = str(e)
+        time.sleep(STOP_ENGINE_INTERVAL)
+
+
+def ensure_stop_engine():
+    """Start the stop engine thread on first use"""
+    thread = stop_engine['thread']
+    if thread is None or not thread.is_alive():
+        thread = threading.Thread(target=run_stop_engine, name='stop-engine', daemon=True)
+        stop_engine['thread'] = thread
+        thread.start()
+
+
+def account_to_dict(account_info):
+    """Serialize MT5 account info"""
+    return {
+        'login': account_info.login,
+        'name': account_info.name,
+        'server': account_info.server,
+        'currency': account_info.currency,
+        'balance': account_info.balance,
+        'equity': account_info.equity,
+        'margin': account_info.margin,
+        'margin_free': account_info.margin_free,
+        'margin_level': account_info.margin_level,
+        'profit': account_info.profit,
+        'leverage': account_info.leverage,
+        'trade_allowed': account_info.trade_allowed,
+        'trade_expert': account_info.trade_expert,
+    }
+
+
+def store_account_snapshot(account_info, extended=None):
+    """Remember the last-known state of the logged-in account"""
+    connection_id = f"{account_info.login}@{account_info.server}"
+    with state_lock:
+        snapshot = account_snapshots.get(connection_id, {})
+        snapshot['account'] = account_to_dict(account_info)
+        if extended is not None:
+            snapshot['extended'] = extended
+        snapshot['updated_at'] = datetime.now().isoformat()
+        account_snapshots[connection_id] = snapshot
+        session['connection_id'] = connection_id
+    return snapshot
+
+
+def serving_stale():
+    """True while warm-up is running and reads should come from persisted state"""
+    return (readiness['started_at'] is not None and not readiness['ready']
+            and readiness['stage'] != 'failed')
+
+
+def get_stale_snapshot(connection_id=None):
+    """Get the persisted snapshot for a connection (default: last active one)"""
+    return account_snapshots.get(connection_id or session['connection_id'])
+
+
+def save_state():
+    """Persist last-known state to STATE_FILE (atomic replace)"""
+    with stop_rules_lock:
+        rules = [{'connection_id': conn, 'kind': kind, 'target': target, **rule}
+                 for (conn, kind, target), rule in stop_rules.items()]
+    # The periodic saver, SIGTERM and atexit can all get here; one writer at a
+    # time, working on a deep copy so nested snapshots cannot change mid-dump
+    with state_lock:
+        state = copy.deepcopy({
+            'saved_at': datetime.now().isoformat(),
+            'session': session,
+            'connections': known_connections,
+            'account_snapshots': account_snapshots,
+            'symbol_catalog': symbol_catalog,
+            'symbol_meta': symbol_cache,
+            'stop_rules': rules,
+        })
+        tmp_path = f'{STATE_FILE}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, STATE_FILE)
+
+
+def load_state():
+    """Restore last-known state from STATE_FILE, if present"""
+    if not os.path.exists(STATE_FILE):
+        return False
+
+    try:
+        with open(STATE_FILE) as f:
+            state = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f'Ignoring unreadable state file {STATE_FILE}: {e}')
+        return False
+
+    with state_lock:
+        session.update(state.get('session', {}))
+        known_connections.update(state.get('connections', {}))
+        active_connections.update(known_connections)
+        account_snapshots.update(state.get('account_snapshots', {}))
+        symbol_catalog.update(state.get('symbol_catalog', {}))
+        symbol_cache.update(state.get('symbol_meta', {}))
+    with stop_rules_lock:
+        for rule in state.get('stop_rules', []):
+            # Rules saved without an account cannot be attributed safely
+            if not rule.get('connection_id'):
+                continue
+            key = (rule.pop('connection_id'), rule.pop('kind'), rule.pop('target'))
+            stop_rules[key] = rule
+        stop_engine['version'] += 1
+    return True
+
+
+def run_state_saver():
+    """Background loop persisting state every STATE_SAVE_INTERVAL seconds"""
+    while True:
+        time.sleep(STATE_SAVE_INTERVAL)
+        try:
+            save_state()
+        except Exception as e:
+            print(f'Failed to save state: {e}')
+
+
+def run_warmup_step(stage, step):
+    """Run a warm-up step, retrying up to WARMUP_ATTEMPTS times"""
+    readiness['stage'] = stage
+    for attempt in range(1, WARMUP_ATTEMPTS + 1):
+        try:
+            step()
+            readiness['error'] = None
+            return True
+        except Exception as e:
+            readiness['error'] = f'{stage}: {e}'
+            if attempt < WARMUP_ATTEMPTS:
+                time.sleep(WARMUP_RETRY_INTERVAL)
+    return False
+
+
+def warm_up():
+    """Initialize the terminal, re-login and preselect symbols, then mark the service ready.
+
+    If a step keeps failing, the stage is set to 'failed' and reads go back to
+    the terminal instead of the persisted snapshots.
+    """
+    mt5 = get_mt5()
+    if not mt5:
+        readiness.update(stage='failed', error='MetaTrader5 module not installed')
+        return
+
+    # The terminal may still be starting after a restart, so keep retrying
+    readiness['stage'] = 'initialize'
+    while not mt5.initialize():
+        readiness['error'] = f'MT5 initialization failed: {mt5.last_error()}'
+        time.sleep(WARMUP_RETRY_INTERVAL)
+    readiness['error'] = None
+
+    def login_step():
+        # Re-login with configured credentials, otherwise rely on the
+        # terminal's saved session
+        account = os.getenv('MT5_ACCOUNT')
+        if account and not mt5.login(int(account), password=os.getenv('MT5_PASSWORD'),
+                                     server=os.getenv('MT5_SERVER')):
+            raise RuntimeError(f'Login failed: {mt5.last_error()}')
+
+        account_info = mt5.account_info()
+        if account_info is None:
+            if account:
+                raise RuntimeError('Failed to get account info')
+            return
+        snapshot = store_account_snapshot(account_info)
+        connection = {
+            'account': str(account_info.login),
+            'server': account_info.server,
+            'login_time': snapshot['updated_at'],
+        }
+        active_connections.setdefault(session['connection_id'], connection)
+        with state_lock:
+            known_connections.setdefault(session['connection_id'], connection)
+
+    def symbols_step():
+        # Preselect known symbols so the first quotes/trades skip symbol lookups.
+        # A symbol that fails is reported but does not block readiness.
+        positions = mt5.positions_get() or []
+        names = {s['name'] for s in symbol_catalog['symbols']} | set(symbol_cache) | {p.symbol for p in positions}
+        for name in names:
+            try:
+                mt5.symbol_select(name, True)
+                with state_lock:
+                    symbol_cache.pop(name, None)
+                get_symbol_meta(mt5, name)
+            except Exception as e:
+                readiness['warnings'].append(f'symbol {name}: {e}')
+
+    def history_step():
+        # Prime the deal history cache used by /analytics
+        if mt5.account_info() is not None:
+            with analytics_lock:
+                update_deal_history(mt5, session['connection_id'])
+
+    for stage, step in (('login', login_step), ('symbols', symbols_step), ('history', history_step)):
+        if not run_warmup_step(stage, step):
+            readiness['stage'] = 'failed'
+            return
+
+    if stop_rules:
+        ensure_stop_engine()
+
+    readiness.update(ready=True, stage='ready', completed_at=datetime.now().isoformat())
+
+
+def handle_sigterm(signum, frame):
+    """Persist state on SIGTERM (atexit hooks do not run for signals)"""
+    save_state()
+    sys.exit(0)
+
+
+def start_background_tasks():
+    """Load persisted state, then start warm-up and periodic state saving"""
+    load_state()
+    atexit.register(save_state)
+    signal.signal(signal.SIGTERM, handle_sigterm)
+    readiness['started_at'] = datetime.now().isoformat()
+    threading.Thread(target=warm_up, name='warm-up', daemon=True).start()
+    threading.Thread(target=run_state_saver, name='state-saver', daemon=True).start()
+
+
+# Endpoints that work whichever account the terminal is logged into
+CONNECTION_EXEMPT_ENDPOINTS = {'health', 'ready', 'initialize', 'login', 'shutdown'}
+
+
+@app.before_request
+def check_connection_id():
+    """Refuse requests addressed (X-Connection-Id) to an account this terminal is not logged into"""
+    connection_id = request.headers.get('X-Connection-Id')
+    if (not connection_id or request.endpoint in CONNECTION_EXEMPT_ENDPOINTS
+            or request.headers.get('X-API-Key') != API_KEY):
+        return None
+
+    if connection_id != session['connection_id']:
+        return jsonify({
+            'success': False,
+            'error': f'Terminal is not logged into {connection_id}; call /login first',
+            'connection_id': session['connection_id'],
+        }), 409
+    return None
+
+
 @app.route('/health', methods=['GET'])
 def health():
     """Health check endpoint"""
@@ -58,10 +976,21 @@ def health():
         'status': 'running',
         'mt5_available': mt5 is not None,
         'active_connections': len(active_connections),
+        'ready': readiness['ready'],
         'timestamp': datetime.now().isoformat()
     })
 
 
+@app.route('/ready', methods=['GET'])
+def ready():
+    """Readiness endpoint: 200 once terminal warm-up has finished, 503 before"""
+    return jsonify({
+        'success': True,
+        **readiness,
+        'timestamp': datetime.now().isoformat()
+    }), 200 if readiness['ready'] else 503
+
+
 @app.route('/initialize', methods=['POST'])
 @require_api_key
 def initialize():
@@ -147,6 +1076,9 @@ def login():
             'server': server,
             'login_time': datetime.now().isoformat()
         }
+        with state_lock:
+            known_connections[connection_id] = active_connections[connection_id]
+        store_account_snapshot(account_info)
 
         return jsonify({
             'success': True,
@@ -180,11 +1112,22 @@ def get_account():
     if not mt5:
         return jsonify({'success': False, 'error': 'MetaTrader5 module not installed'}), 500
 
+    # Serve the persisted snapshot until warm-up has finished
+    snapshot = get_stale_snapshot() if serving_stale() else None
+    if snapshot:
+        return jsonify({
+            'success': True,
+            'stale': True,
+            'snapshot_time': snapshot['updated_at'],
+            'account': snapshot['account'],
+        })
+
     try:
         account_info = mt5.account_info()
         if account_info is None:
             return jsonify({'success': False, 'error': 'Not logged in or failed to get account info'}), 401
 
+        store_account_snapshot(account_info)
         return jsonify({
             'success': True,
             'account': {
@@ -374,23 +1317,7 @@ def open_trade():
             price = tick.bid
 
         # Prepare request
-        request_dict = {
-            'action': mt5.TRADE_ACTION_DEAL,
-            'symbol': symbol,
-            'volume': volume,
-            'type': trade_type,
-            'price': price,
-            'deviation': 20,
-            'magic': magic,
-            'comment': comment,
-            'type_time': mt5.ORDER_TIME_GTC,
-            'type_filling': mt5.ORDER_FILLING_IOC,
-        }
-
-        if sl:
-            request_dict['sl'] = float(sl)
-        if tp:
-            request_dict['tp'] = float(tp)
+        request_dict = build_open_request(mt5, symbol, trade_type, volume, price, sl, tp, magic, comment)
 
         # Send order
         result = mt5.order_send(request_dict)
@@ -418,6 +1345,113 @@ def open_trade():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@app.route('/trade/quote', methods=['POST'])
+@require_api_key
+def quote_trade():
+    """Pre-trade quote: required margin, tick value, projected P/L at SL/TP and order_check result"""
+    mt5 = get_mt5()
+    if not mt5:
+        return jsonify({'success': False, 'error': 'MetaTrader5 module not installed'}), 500
+
+    data = request.json
+    if not data:
+        return jsonify({'success': False, 'error': 'Request body required'}), 400
+
+    symbol = data.get('symbol')
+    order_type = data.get('type', 'buy').lower()
+    magic = data.get('magic', 123456)
+
+    if not symbol:
+        return jsonify({'success': False, 'error': 'symbol is required'}), 400
+
+    try:
+        volume = float(data.get('volume', 0.01))
+        sl = float(data['sl']) if data.get('sl') else None
+        tp = float(data['tp']) if data.get('tp') else None
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'volume, sl and tp must be numeric'}), 400
+
+    try:
+        meta = get_symbol_meta(mt5, symbol)
+        limits = get_symbol_limits(mt5, symbol)
+        if meta is None or limits is None:
+            return jsonify({'success': False, 'error': f'Symbol {symbol} not found'}), 400
+
+        # Symbols outside Market Watch have no ticks until selected
+        if not limits['visible']:
+            if not mt5.symbol_select(symbol, True):
+                return jsonify({'success': False, 'error': f'Failed to select symbol {symbol}'}), 400
+            limits['visible'] = True
+
+        tick = mt5.symbol_info_tick(symbol)
+        if tick is None:
+            return jsonify({'success': False, 'error': 'Failed to get price'}), 500
+
+        side = 0 if order_type == 'buy' else 1
+        price = tick.ask if side == 0 else tick.bid
+        direction = 1 if side == 0 else -1
+
+        margin = get_margin(mt5, symbol, side, volume, price)
+        tick_value = get_tick_value(mt5, symbol, price)
+
+        # Projected P/L from the cached tick value: ticks moved * tick value * volume
+        def projected(level):
+            if not level or not tick_value or not meta['tick_size']:
+                return None
+            return {
+                'price': level,
+                'points': round((level - price) * direction / meta['point']),
+                'profit': (level - price) * direction / meta['tick_size'] * tick_value * volume,
+            }
+
+        # Orders that fail local validation never reach the terminal
+        errors = validate_order(mt5, meta, limits, side, volume, tick.bid, tick.ask, sl, tp)
+        check = None
+        if not errors:
+            trade_type = mt5.ORDER_TYPE_BUY if side == 0 else mt5.ORDER_TYPE_SELL
+            result = mt5.order_check(build_open_request(mt5, symbol, trade_type, volume, price, sl, tp, magic))
+            if result is None:
+                errors.append(f'order_check failed: {mt5.last_error()}')
+            else:
+                check = {
+                    'retcode': result.retcode,
+                    'comment': result.comment,
+                    'balance': result.balance,
+                    'equity': result.equity,
+                    'margin': result.margin,
+                    'margin_free': result.margin_free,
+                    'margin_level': result.margin_level,
+                }
+                if result.retcode != 0:
+                    errors.append(f'Order check failed: {result.comment}')
+
+        return jsonify({
+            'success': True,
+            'valid': not errors,
+            'errors': errors,
+            'symbol': symbol,
+            'type': order_type,
+            'volume': volume,
+            'price': price,
+            'bid': tick.bid,
+            'ask': tick.ask,
+            'spread': round((tick.ask - tick.bid) / meta['point']),
+            'margin': margin,
+            'tick_value': tick_value,
+            'tick_size': meta['tick_size'],
+            'contract_size': meta['contract_size'],
+            'volume_min': limits['volume_min'],
+            'volume_max': limits['volume_max'],
+            'volume_step': limits['volume_step'],
+            'stops_level': limits['stops_level'],
+            'projected_sl': projected(sl),
+            'projected_tp': projected(tp),
+            'check': check,
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
 @app.route('/trade/close', methods=['POST'])
 @require_api_key
 def close_trade():
@@ -441,37 +1475,14 @@ def close_trade():
             return jsonify({'success': False, 'error': f'Position {ticket} not found'}), 404
 
         position = position[0]
-        symbol = position.symbol
-        volume = position.volume
-        pos_type = position.type
 
         # Get current price
-        tick = mt5.symbol_info_tick(symbol)
+        tick = mt5.symbol_info_tick(position.symbol)
         if tick is None:
             return jsonify({'success': False, 'error': 'Failed to get price'}), 500
 
-        # Opposite trade to close
-        if pos_type == 0:  # Buy position
-            trade_type = mt5.ORDER_TYPE_SELL
-            price = tick.bid
-        else:  # Sell position
-            trade_type = mt5.ORDER_TYPE_BUY
-            price = tick.ask
-
         # Prepare close request
-        request_dict = {
-            'action': mt5.TRADE_ACTION_DEAL,
-            'symbol': symbol,
-            'volume': volume,
-            'type': trade_type,
-            'position': int(ticket),
-            'price': price,
-            'deviation': 20,
-            'magic': 123456,
-            'comment': 'AU-Next Close',
-            'type_time': mt5.ORDER_TIME_GTC,
-            'type_filling': mt5.ORDER_FILLING_IOC,
-        }
+        request_dict = build_close_request(mt5, position, tick)
 
         result = mt5.order_send(request_dict)
 
@@ -563,6 +1574,16 @@ def get_symbols():
     if not mt5:
         return jsonify({'success': False, 'error': 'MetaTrader5 module not installed'}), 500
 
+    # Serve the persisted catalog until warm-up has finished
+    if serving_stale() and symbol_catalog['symbols']:
+        return jsonify({
+            'success': True,
+            'stale': True,
+            'snapshot_time': symbol_catalog['updated_at'],
+            'symbols': symbol_catalog['symbols'],
+            'count': len(symbol_catalog['symbols'])
+        })
+
     try:
         symbols = mt5.symbols_get()
         if symbols is None:
@@ -581,6 +1602,8 @@ def get_symbols():
                 'digits': s.digits,
                 'trade_mode': s.trade_mode,
             })
+        with state_lock:
+            symbol_catalog.update(symbols=symbols_list, updated_at=datetime.now().isoformat())
 
         return jsonify({
             'success': True,
@@ -603,6 +1626,18 @@ def get_account_extended():
     account = data.get('account')
     server = data.get('server')
 
+    # Serve the persisted snapshot until warm-up has finished
+    snapshot = None
+    if serving_stale():
+        snapshot = get_stale_snapshot(f"{account}@{server}" if account and server else None)
+    if snapshot and 'extended' in snapshot:
+        return jsonify({
+            'success': True,
+            'stale': True,
+            'snapshot_time': snapshot['updated_at'],
+            **snapshot['extended'],
+        })
+
     try:
         # If account/server provided, check if we need to login
         # (For production, credentials should be stored securely and reused)
@@ -639,8 +1674,7 @@ def get_account_extended():
                 'comment': pos.comment,
             })
 
-        return jsonify({
-            'success': True,
+        extended = {
             'login': account_info.login,
             'name': account_info.name,
             'server': account_info.server,
@@ -659,11 +1693,175 @@ def get_account_extended():
             'total_lot_size': total_lot_size,
             'positions_profit': total_profit,
             'positions': positions_data,
-        })
+        }
+        store_account_snapshot(account_info, extended)
+
+        return jsonify({'success': True, **extended})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/portfolio', methods=['GET'])
+@require_api_key
+def get_portfolio():
+    """Get portfolio exposure, profit and margin by symbol, currency and magic"""
+    mt5 = get_mt5()
+    if not mt5:
+        return jsonify({'success': False, 'error': 'MetaTrader5 module not installed'}), 500
+
+    try:
+        positions = mt5.positions_get()
+        if not positions:
+            return jsonify({
+                'success': True,
+                'count': 0,
+                'totals': {'volume': 0, 'net_volume': 0, 'profit': 0, 'swap': 0, 'margin': 0},
+                'symbols': [],
+                'currencies': [],
+                'magics': [],
+            })
+
+        return jsonify({'success': True, **compute_portfolio(mt5, positions)})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@app.route('/analytics', methods=['GET'])
+@require_api_key
+def get_analytics():
+    """Get trade-history analytics: balance curve, drawdown, win rate, profit factor"""
+    mt5 = get_mt5()
+    if not mt5:
+        return jsonify({'success': False, 'error': 'MetaTrader5 module not installed'}), 500
+
+    try:
+        points = min(max(int(request.args.get('points', 500)), 2), ANALYTICS_MAX_POINTS)
+    except ValueError:
+        return jsonify({'success': False, 'error': 'points must be an integer'}), 400
+
+    try:
+        account_info = mt5.account_info()
+        if account_info is None:
+            return jsonify({'success': False, 'error': 'Not logged in or failed to get account info'}), 401
+
+        key = f"{account_info.login}@{account_info.server}"
+        with analytics_lock:
+            state = update_deal_history(mt5, key)
+            if state['deals'] is None:
+                return jsonify({'success': True, 'deals_count': 0, 'total_trades': 0})
+
+            result = state['results'].get(points)
+            if result is None:
+                result = compute_trade_analytics(mt5, state['deals'], points)
+                # Keep a bounded set of results, evicting the oldest
+                if len(state['results']) >= ANALYTICS_RESULTS_CACHE:
+                    del state['results'][next(iter(state['results']))]
+                state['results'][points] = result
+
+        return jsonify({'success': True, 'account': key, **result})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/rules', methods=['GET'])
+@require_api_key
+def get_stop_rules():
+    """List stop management rules and engine status"""
+    with stop_rules_lock:
+        rules = [{'connection_id': conn, kind: target, **rule}
+                 for (conn, kind, target), rule in stop_rules.items()]
+
+    thread = stop_engine['thread']
+    return jsonify({
+        'success': True,
+        'rules': rules,
+        'count': len(rules),
+        'engine': {
+            'running': thread is not None and thread.is_alive(),
+            'evaluations': stop_engine['evaluations'],
+            'modifications': stop_engine['modifications'],
+            'closes': stop_engine['closes'],
+            'last_error': stop_engine['last_error'],
+        }
+    })
+
+
+@app.route('/rules', methods=['POST'])
+@require_api_key
+def set_stop_rule():
+    """Register a trailing-stop / break-even / time-exit rule for a ticket or magic number of the logged-in account"""
+    data = request.json
+    if not data:
+        return jsonify({'success': False, 'error': 'Request body required'}), 400
+
+    connection_id = session['connection_id']
+    if connection_id is None:
+        return jsonify({'success': False, 'error': 'Not logged in'}), 401
+
+    ticket = data.get('ticket')
+    magic = data.get('magic')
+    if (ticket is None) == (magic is None):
+        return jsonify({'success': False, 'error': 'Exactly one of ticket or magic is required'}), 400
+
+    if not any(data.get(f) is not None for f in ('trailing_distance', 'break_even_trigger', 'max_duration')):
+        return jsonify({
+            'success': False,
+            'error': 'trailing_distance, break_even_trigger or max_duration is required'
+        }), 400
+
+    try:
+        rule = {f: float(data[f]) for f in STOP_RULE_DEFAULTS if data.get(f) is not None}
+        key = (connection_id, 'ticket', int(ticket)) if ticket is not None else (connection_id, 'magic', int(magic))
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'Rule parameters must be numeric'}), 400
+
+    if any(v < 0 for v in rule.values()):
+        return jsonify({'success': False, 'error': 'Rule parameters must not be negative'}), 400
+
+    with stop_rules_lock:
+        stop_rules[key] = rule
+        stop_engine['version'] += 1
+    ensure_stop_engine()
+
+    return jsonify({
+        'success': True,
+        'message': 'Rule registered',
+        'rule': {'connection_id': connection_id, key[1]: key[2], **rule},
+    })
+
+
+@app.route('/rules/remove', methods=['POST'])
+@require_api_key
+def remove_stop_rule():
+    """Remove the logged-in account's rule for a ticket or magic number"""
+    data = request.json
+    if not data:
+        return jsonify({'success': False, 'error': 'Request body required'}), 400
+
+    connection_id = session['connection_id']
+    if connection_id is None:
+        return jsonify({'success': False, 'error': 'Not logged in'}), 401
+
+    ticket = data.get('ticket')
+    magic = data.get('magic')
+    if (ticket is None) == (magic is None):
+        return jsonify({'success': False, 'error': 'Exactly one of ticket or magic is required'}), 400
+
+    try:
+        key = (connection_id, 'ticket', int(ticket)) if ticket is not None else (connection_id, 'magic', int(magic))
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'ticket and magic must be numeric'}), 400
+
+    with stop_rules_lock:
+        removed = stop_rules.pop(key, None)
+        stop_engine['version'] += 1
+
+    if removed is None:
+        return jsonify({'success': False, 'error': f'No rule for {key[1]} {key[2]} on {connection_id}'}), 404
+
+    return jsonify({'success': True, 'message': 'Rule removed'})
+
+
 @app.route('/ea/status', methods=['POST'])
 @require_api_key
 def get_ea_status():
@@ -737,7 +1935,9 @@ def shutdown():
     mt5 = get_mt5()
     if mt5:
         mt5.shutdown()
+        # The last-known connection table stays persisted for the next warm start
         active_connections.clear()
+        save_state()
 
     return jsonify({
         'success': True,
@@ -758,6 +1958,7 @@ if __name__ == '__main__':
 ║                                                          ║
 ║  Endpoints:                                              ║
 ║    GET  /health           - Health check                 ║
+║    GET  /ready            - Readiness (warm-up done)     ║
 ║    POST /initialize       - Initialize MT5               ║
 ║    POST /login            - Login to account             ║
 ║    GET  /account          - Get account info             ║
@@ -766,12 +1967,19 @@ if __name__ == '__main__':
 ║    GET  /orders           - Get pending orders           ║
 ║    GET  /history          - Get trade history            ║
 ║    POST /trade/open       - Open new trade               ║
+║    POST /trade/quote      - Pre-trade quote & check      ║
 ║    POST /trade/close      - Close position               ║
 ║    POST /trade/modify     - Modify SL/TP                 ║
 ║    GET  /symbols          - Get available symbols        ║
+║    GET  /portfolio        - Portfolio exposure & risk    ║
+║    GET  /analytics        - Trade-history analytics      ║
+║    GET  /rules            - List stop rules              ║
+║    POST /rules            - Add trailing/BE/time rule    ║
+║    POST /rules/remove     - Remove stop rule             ║
 ║    POST /ea/status        - Check EA status              ║
 ║    POST /shutdown         - Shutdown MT5                 ║
 ╚══════════════════════════════════════════════════════════╝
     """)
 
+    start_background_tasks()
     app.run(host='0.0.0.0', port=port, debug=debug)
@@ -0,0 +1,329 @@
+"""
+MT5 Terminal Simulator
+In-memory stand-in for the MetaTrader5 package, used when MT5_SIMULATOR=1.
+
+Implements the subset of the MetaTrader5 API that app.py calls, so the
+service (and the router in front of it) can be run and tested on any OS
+without a terminal. Accounts accept any password; each login@server gets
+its own balance, positions and deal history. Prices move slowly around a
+fixed base so trailing stops and P/L have something to follow.
+"""
+
+import math
+import time
+import threading
+from collections import namedtuple
+from datetime import datetime, timezone
+
+TerminalInfo = namedtuple('TerminalInfo', 'connected trade_allowed name path company')
+AccountInfo = namedtuple('AccountInfo', 'login name server currency company balance credit profit equity '
+                                        'margin margin_free margin_level leverage trade_allowed trade_expert')
+SymbolInfo = namedtuple('SymbolInfo', 'name description path visible select currency_base currency_profit '
+                                      'currency_margin digits point trade_contract_size trade_tick_value '
+                                      'trade_tick_size trade_mode trade_stops_level volume_min volume_max '
+                                      'volume_step bid ask spread time')
+Tick = namedtuple('Tick', 'time bid ask last volume time_msc flags volume_real')
+TradePosition = namedtuple('TradePosition', 'ticket time time_msc time_update time_update_msc type magic '
+                                            'identifier reason volume price_open sl tp price_current swap '
+                                            'profit symbol comment external_id')
+TradeDeal = namedtuple('TradeDeal', 'ticket order time time_msc type entry magic position_id reason volume '
+                                    'price commission swap profit fee symbol comment external_id')
+OrderSendResult = namedtuple('OrderSendResult', 'retcode deal order volume price bid ask comment request_id '
+                                                'retcode_external request')
+OrderCheckResult = namedtuple('OrderCheckResult', 'retcode balance equity profit margin margin_free '
+                                                  'margin_level comment request')
+
+# name: (base, profit currency, contract size, digits, base price, stops level)
+SYMBOLS = {
+    'EURUSD': ('EUR', 'USD', 100000, 5, 1.08500, 10),
+    'GBPUSD': ('GBP', 'USD', 100000, 5, 1.27000, 10),
+    'USDJPY': ('USD', 'JPY', 100000, 3, 150.000, 10),
+    'XAUUSD': ('XAU', 'USD', 100, 2, 2350.00, 20),
+    'US30': ('USD', 'USD', 1, 2, 39000.00, 100),
+}
+SPREAD_POINTS = 10
+INITIAL_BALANCE = 10000.0
+LEVERAGE = 100
+
+
+class Simulator:
+    """In-memory MetaTrader5 terminal"""
+
+    ORDER_TYPE_BUY = 0
+    ORDER_TYPE_SELL = 1
+    TRADE_ACTION_DEAL = 1
+    TRADE_ACTION_SLTP = 6
+    ORDER_TIME_GTC = 0
+    ORDER_FILLING_FOK = 0
+    ORDER_FILLING_IOC = 1
+    DEAL_TYPE_BUY = 0
+    DEAL_TYPE_SELL = 1
+    DEAL_TYPE_BALANCE = 2
+    DEAL_ENTRY_IN = 0
+    DEAL_ENTRY_OUT = 1
+    DEAL_ENTRY_INOUT = 2
+    DEAL_ENTRY_OUT_BY = 3
+    SYMBOL_TRADE_MODE_DISABLED = 0
+    SYMBOL_TRADE_MODE_LONGONLY = 1
+    SYMBOL_TRADE_MODE_SHORTONLY = 2
+    SYMBOL_TRADE_MODE_CLOSEONLY = 3
+    SYMBOL_TRADE_MODE_FULL = 4
+    TRADE_RETCODE_DONE = 10009
+    TRADE_RETCODE_INVALID = 10013
+    TRADE_RETCODE_INVALID_VOLUME = 10014
+    TRADE_RETCODE_INVALID_STOPS = 10016
+    TRADE_RETCODE_POSITION_CLOSED = 10036
+    RES_S_OK = 1
+    RES_E_FAIL = -1
+    RES_E_INVALID_PARAMS = -2
+    RES_E_NOT_FOUND = -4
+    RES_E_AUTH_FAILED = -6
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.initialized = False
+        self.current = None
+        self.accounts = {}
+        self.visible = {name: name in ('EURUSD', 'GBPUSD') for name in SYMBOLS}
+        self.next_ticket = 1000
+        self.error = (self.RES_S_OK, 'Success')
+
+    def _fail(self, code, message, result=None):
+        """Record last_error and return result"""
+        self.error = (code, message)
+        return result
+
+    def _ticket(self):
+        self.next_ticket += 1
+        return self.next_ticket
+
+    def _account(self):
+        """State of the logged-in account (None when logged out)"""
+        if not self.initialized or self.current is None:
+            return None
+        return self.accounts[self.current]
+
+    def _prices(self, symbol, now=None):
+        """Current (bid, ask) for a symbol, drifting slowly around its base price"""
+        _, _, _, digits, base, _ = SYMBOLS[symbol]
+        now = time.time() if now is None else now
+        phase = sum(map(ord, symbol))
+        bid = round(base * (1 + 0.002 * math.sin(now / 60 + phase)), digits)
+        return bid, round(bid + SPREAD_POINTS * 10 ** -digits, digits)
+
+    def _profit(self, symbol, side, volume, price_open, price_close):
+        """Profit in the account currency (USD)"""
+        _, currency_profit, contract_size, _, _, _ = SYMBOLS[symbol]
+        profit = (price_close - price_open) * (1 if side == 0 else -1) * volume * contract_size
+        if currency_profit != 'USD':
+            profit /= price_close
+        return round(profit, 2)
+
+    def _position(self, pos):
+        bid, ask = self._prices(pos['symbol'])
+        price = bid if pos['type'] == 0 else ask
+        return TradePosition(
+            pos['ticket'], pos['time'], pos['time'] * 1000, pos['time'], pos['time'] * 1000, pos['type'],
+            pos['magic'], pos['ticket'], 3, pos['volume'], pos['price_open'], pos['sl'], pos['tp'], price, 0.0,
+            self._profit(pos['symbol'], pos['type'], pos['volume'], pos['price_open'], price),
+            pos['symbol'], pos['comment'], '')
+
+    # Terminal and account
+
+    def initialize(self, path=None, **kwargs):
+        self.initialized = True
+        return True
+
+    def shutdown(self):
+        self.initialized = False
+        return True
+
+    def last_error(self):
+        return self.error
+
+    def terminal_info(self):
+        if not self.initialized:
+            return None
+        return TerminalInfo(True, True, 'MetaTrader 5 Simulator', '', 'AU-Next')
+
+    def login(self, login, password=None, server=None, timeout=None):
+        if not self.initialized:
+            return self._fail(self.RES_E_FAIL, 'Terminal not initialized', False)
+        with self.lock:
+            key = (int(login), server or 'Simulator')
+            self.accounts.setdefault(key, {'balance': INITIAL_BALANCE, 'positions': {}, 'deals': []})
+            self.current = key
+        return True
+
+    def account_info(self):
+        with self.lock:
+            account = self._account()
+            if account is None:
+                return self._fail(self.RES_E_AUTH_FAILED, 'Not logged in')
+            positions = [self._position(p) for p in account['positions'].values()]
+            profit = round(sum(p.profit for p in positions), 2)
+            margin = round(sum(self.order_calc_margin(p.type, p.symbol, p.volume, p.price_open)
+                               for p in positions), 2)
+            equity = round(account['balance'] + profit, 2)
+            return AccountInfo(
+                self.current[0], f'Simulated {self.current[0]}', self.current[1], 'USD', 'AU-Next',
+                account['balance'], 0.0, profit, equity, margin, round(equity - margin, 2),
+                round(equity / margin * 100, 2) if margin else 0.0, LEVERAGE, True, True)
+
+    # Symbols
+
+    def symbol_info(self, symbol):
+        if symbol not in SYMBOLS:
+            return self._fail(self.RES_E_NOT_FOUND, f'Symbol {symbol} not found')
+        base, currency_profit, contract_size, digits, _, stops_level = SYMBOLS[symbol]
+        point = 10 ** -digits
+        bid, ask = self._prices(symbol)
+        tick_value = contract_size * point if currency_profit == 'USD' else contract_size * point / bid
+        return SymbolInfo(
+            symbol, symbol, f'Simulator\\{symbol}', self.visible[symbol], self.visible[symbol], base,
+            currency_profit, base, digits, point, contract_size, tick_value, point, self.SYMBOL_TRADE_MODE_FULL,
+            stops_level, 0.01, 100.0, 0.01, bid, ask, SPREAD_POINTS, int(time.time()))
+
+    def symbol_info_tick(self, symbol):
+        if symbol not in SYMBOLS or not self.visible[symbol]:
+            return self._fail(self.RES_E_NOT_FOUND, f'No ticks for {symbol}')
+        now = time.time()
+        bid, ask = self._prices(symbol, now)
+        return Tick(int(now), bid, ask, 0.0, 0, int(now * 1000), 6, 0.0)
+
+    def symbol_select(self, symbol, enable=True):
+        if symbol not in SYMBOLS:
+            return self._fail(self.RES_E_NOT_FOUND, f'Symbol {symbol} not found', False)
+        self.visible[symbol] = bool(enable)
+        return True
+
+    def symbols_get(self, group=None):
+        return tuple(self.symbol_info(name) for name in SYMBOLS)
+
+    # Positions, orders and history
+
+    def positions_get(self, symbol=None, group=None, ticket=None):
+        with self.lock:
+            account = self._account()
+            if account is None:
+                return self._fail(self.RES_E_AUTH_FAILED, 'Not logged in')
+            return tuple(self._position(p) for p in account['positions'].values()
+                         if (ticket is None or p['ticket'] == ticket)
+                         and (symbol is None or p['symbol'] == symbol))
+
+    def orders_get(self, symbol=None, group=None, ticket=None):
+        if self._account() is None:
+            return self._fail(self.RES_E_AUTH_FAILED, 'Not logged in')
+        return ()
+
+    def history_deals_get(self, date_from, date_to, group=None):
+        # Like the terminal, naive datetimes are taken as UTC
+        def epoch(value):
+            if isinstance(value, datetime):
+                return (value if value.tzinfo else value.replace(tzinfo=timezone.utc)).timestamp()
+            return value
+
+        with self.lock:
+            account = self._account()
+            if account is None:
+                return self._fail(self.RES_E_AUTH_FAILED, 'Not logged in')
+            start, end = epoch(date_from), epoch(date_to)
+            return tuple(d for d in account['deals'] if start <= d.time <= end)
+
+    # Trading
+
+    def order_calc_margin(self, action, symbol, volume, price):
+        if symbol not in SYMBOLS:
+            return self._fail(self.RES_E_NOT_FOUND, f'Symbol {symbol} not found')
+        base, _, contract_size, _, _, _ = SYMBOLS[symbol]
+        notional = volume * contract_size * (1 if base == 'USD' else price)
+        return round(notional / LEVERAGE, 2)
+
+    def _check(self, request):
+        """Validate a request, returning (retcode, comment)"""
+        if self._account() is None:
+            return self.TRADE_RETCODE_INVALID, 'Not logged in'
+        symbol = request.get('symbol')
+        if symbol not in SYMBOLS:
+            return self.TRADE_RETCODE_INVALID, f'Unknown symbol {symbol}'
+        if request.get('action') == self.TRADE_ACTION_DEAL and not 0.01 <= request.get('volume', 0) <= 100:
+            return self.TRADE_RETCODE_INVALID_VOLUME, 'Invalid volume'
+
+        side = request.get('type')
+        if request.get('action') == self.TRADE_ACTION_SLTP:
+            position = self._account()['positions'].get(request.get('position'))
+            if position is None:
+                return self.TRADE_RETCODE_POSITION_CLOSED, 'Position not found'
+            side = position['type']
+        elif request.get('position'):
+            return self.TRADE_RETCODE_DONE, 'Done'
+
+        # Buy stops are checked against the bid, sell stops against the ask
+        digits, stops_level = SYMBOLS[symbol][3], SYMBOLS[symbol][5]
+        bid, ask = self._prices(symbol)
+        price, direction = (bid, 1) if side == 0 else (ask, -1)
+        min_distance = stops_level * 10 ** -digits - 1e-9
+        sl, tp = request.get('sl') or 0, request.get('tp') or 0
+        if sl and (price - sl) * direction < min_distance:
+            return self.TRADE_RETCODE_INVALID_STOPS, 'Invalid stops'
+        if tp and (tp - price) * direction < min_distance:
+            return self.TRADE_RETCODE_INVALID_STOPS, 'Invalid stops'
+        return self.TRADE_RETCODE_DONE, 'Done'
+
+    def order_check(self, request):
+        with self.lock:
+            retcode, comment = self._check(request)
+            account = self.account_info()
+            if account is None:
+                return OrderCheckResult(self.TRADE_RETCODE_INVALID, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, comment, request)
+            margin = self.order_calc_margin(request.get('type'), request['symbol'], request.get('volume', 0),
+                                            request.get('price', 0)) if retcode == self.TRADE_RETCODE_DONE else 0.0
+            free = round(account.margin_free - margin, 2)
+            total = account.margin + margin
+            return OrderCheckResult(
+                0 if retcode == self.TRADE_RETCODE_DONE else retcode, account.balance, account.equity,
+                account.profit, total, free, round(account.equity / total * 100, 2) if total else 0.0,
+                comment, request)
+
+    def order_send(self, request):
+        with self.lock:
+            retcode, comment = self._check(request)
+            if retcode != self.TRADE_RETCODE_DONE:
+                return OrderSendResult(retcode, 0, 0, 0.0, 0.0, 0.0, 0.0, comment, 0, 0, request)
+
+            account = self._account()
+            symbol = request['symbol']
+            bid, ask = self._prices(symbol)
+            now = int(time.time())
+
+            if request['action'] == self.TRADE_ACTION_SLTP:
+                position = account['positions'][request['position']]
+                position.update(sl=request.get('sl') or 0.0, tp=request.get('tp') or 0.0)
+                return OrderSendResult(retcode, 0, 0, 0.0, 0.0, bid, ask, comment, 0, 0, request)
+
+            side = request['type']
+            price = ask if side == self.ORDER_TYPE_BUY else bid
+            order = self._ticket()
+            if request.get('position'):
+                position = account['positions'].pop(request['position'], None)
+                if position is None:
+                    return OrderSendResult(self.TRADE_RETCODE_POSITION_CLOSED, 0, 0, 0.0, 0.0, bid, ask,
+                                           'Position not found', 0, 0, request)
+                profit = self._profit(symbol, position['type'], position['volume'], position['price_open'], price)
+                account['balance'] = round(account['balance'] + profit, 2)
+                deal = TradeDeal(self._ticket(), order, now, now * 1000, side, self.DEAL_ENTRY_OUT,
+                                 position['magic'], position['ticket'], 3, position['volume'], price, 0.0, 0.0,
+                                 profit, 0.0, symbol, request.get('comment', ''), '')
+            else:
+                # Market orders open a position with the order's ticket, as in the terminal
+                ticket = order
+                account['positions'][ticket] = {
+                    'ticket': ticket, 'time': now, 'type': side, 'magic': request.get('magic', 0),
+                    'volume': request['volume'], 'price_open': price, 'sl': request.get('sl') or 0.0,
+                    'tp': request.get('tp') or 0.0, 'symbol': symbol, 'comment': request.get('comment', ''),
+                }
+                deal = TradeDeal(self._ticket(), order, now, now * 1000, side, self.DEAL_ENTRY_IN,
+                                 request.get('magic', 0), ticket, 3, request['volume'], price, 0.0, 0.0, 0.0, 0.0,
+                                 symbol, request.get('comment', ''), '')
+            account['deals'].append(deal)
+            return OrderSendResult(retcode, deal.ticket, order, deal.volume, price, bid, ask, comment, 0, 0, request)
@@ -0,0 +1,373 @@
+"""
+MT5 Service Router
+Flask API that shards accounts across several MT5 service instances.
+
+Each app.py process drives a single terminal session, so accounts are
+spread over instances by consistent-hashing the connection id
+(account@server). Adding or removing an instance only moves the accounts
+that hashed to it.
+
+The connection id is taken from (in order):
+- X-Connection-Id header
+- connection_id query parameter or JSON field
+- account and server JSON fields
+
+Run locally with two instances (each needs its own port and state file;
+MT5_SIMULATOR=1 replaces the terminal with an in-memory one, so this works
+on any OS):
+  MT5_SIMULATOR=1 MT5_SERVICE_PORT=5001 MT5_STATE_FILE=mt5_state_5001.json python app.py
+  MT5_SIMULATOR=1 MT5_SERVICE_PORT=5002 MT5_STATE_FILE=mt5_state_5002.json python app.py
+  MT5_ROUTER_BACKENDS=http://localhost:5001,http://localhost:5002 python router.py
+
+Tests: python -m pytest tests
+"""
+
+import os
+import json
+import time
+import bisect
+import hashlib
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from flask import Flask, request, jsonify, Response
+from flask_cors import CORS
+from dotenv import load_dotenv
+
+load_dotenv()
+
+app = Flask(__name__)
+CORS(app, origins=os.getenv('CORS_ORIGINS', 'http://localhost:3000').split(','))
+
+# API Key for authentication (forwarded to the backends)
+API_KEY = os.getenv('MT5_SERVICE_API_KEY', 'mt5-service-secret-key')
+
+VIRTUAL_NODES = int(os.getenv('MT5_ROUTER_VNODES', 100))
+HEALTH_INTERVAL = float(os.getenv('MT5_ROUTER_HEALTH_INTERVAL', 5))
+HEALTH_FAILURES = int(os.getenv('MT5_ROUTER_HEALTH_FAILURES', 2))
+FORWARD_TIMEOUT = float(os.getenv('MT5_ROUTER_TIMEOUT', 30))
+
+# Configured backends and their health, keyed by base URL
+backends = {}
+backends_lock = threading.Lock()
+
+# Consistent-hash ring over healthy backends: (sorted hashes, their owners),
+# published as one tuple so lookups never see a half-rebuilt ring
+ring = ([], [])
+
+executor = ThreadPoolExecutor(max_workers=int(os.getenv('MT5_ROUTER_WORKERS', 16)))
+
+
+def require_api_key(f):
+    """Decorator to require API key authentication"""
+    from functools import wraps
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        api_key = request.headers.get('X-API-Key')
+        if api_key != API_KEY:
+            return jsonify({'success': False, 'error': 'Invalid API key'}), 401
+        return f(*args, **kwargs)
+    return decorated
+
+
+def hash_key(key):
+    """Stable 64-bit hash for ring positions"""
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], 'big')
+
+
+def rebuild_ring():
+    """Rebuild the ring from healthy backends (call with backends_lock held)"""
+    points = sorted(
+        (hash_key(f'{url}#{i}'), url)
+        for url, backend in backends.items() if backend['healthy']
+        for i in range(VIRTUAL_NODES)
+    )
+    global ring
+    ring = ([h for h, _ in points], [url for _, url in points])
+
+
+def get_backend(connection_id):
+    """Get the backend owning a connection id (None when no backend is healthy)"""
+    hashes, nodes = ring
+    if not hashes:
+        return None
+    idx = bisect.bisect(hashes, hash_key(connection_id)) % len(hashes)
+    return nodes[idx]
+
+
+def add_backend(url):
+    """Register a backend; it joins the ring once a health check passes"""
+    url = url.rstrip('/')
+    with backends_lock:
+        if url not in backends:
+            backends[url] = {'healthy': False, 'failures': 0, 'last_check': None, 'last_error': None}
+    return url
+
+
+def remove_backend(url):
+    """Remove a backend; only the accounts it owned move to other backends"""
+    with backends_lock:
+        removed = backends.pop(url.rstrip('/'), None)
+        rebuild_ring()
+    return removed is not None
+
+
+def check_backend(url):
+    """Health-check one backend and update the ring if its state changed.
+
+    Uses /ready, which only returns 200 once the backend's terminal has warmed up.
+    """
+    try:
+        with urllib.request.urlopen(f'{url}/ready', timeout=HEALTH_INTERVAL) as resp:
+            ok = resp.status == 200
+        error = None if ok else f'HTTP {resp.status}'
+    except (urllib.error.URLError, OSError) as e:
+        ok, error = False, str(e)
+
+    with backends_lock:
+        backend = backends.get(url)
+        if backend is None:
+            return
+        backend['last_check'] = datetime.now().isoformat()
+        backend['last_error'] = error
+        was_healthy = backend['healthy']
+        if ok:
+            backend['failures'] = 0
+            backend['healthy'] = True
+        else:
+            backend['failures'] += 1
+            if backend['failures'] >= HEALTH_FAILURES:
+                backend['healthy'] = False
+        if backend['healthy'] != was_healthy:
+            rebuild_ring()
+
+
+def run_health_checks():
+    """Background loop health-checking all backends"""
+    while True:
+        with backends_lock:
+            urls = list(backends)
+        list(executor.map(check_backend, urls))
+        time.sleep(HEALTH_INTERVAL)
+
+
+def connection_id_from(data):
+    """Connection id from a JSON body: connection_id, or account and server"""
+    if not isinstance(data, dict):
+        return None
+    connection_id = data.get('connection_id')
+    if not connection_id and data.get('account') and data.get('server'):
+        connection_id = f"{data['account']}@{data['server']}"
+    return connection_id
+
+
+def get_connection_id(data):
+    """Extract the connection id used for routing from the current request"""
+    return (request.headers.get('X-Connection-Id') or request.args.get('connection_id')
+            or connection_id_from(data))
+
+
+def forward(url, connection_id, method, path, query=None, body=None):
+    """Forward a request to a backend, returning (status, JSON bytes).
+
+    The backend rejects the request (409) if its terminal is logged into a
+    different account than connection_id.
+    """
+    target = f'{url}{path}' + (f'?{query}' if query else '')
+    headers = {'X-API-Key': API_KEY, 'X-Connection-Id': connection_id}
+    if body is not None:
+        headers['Content-Type'] = 'application/json'
+    req = urllib.request.Request(target, data=body, method=method, headers=headers)
+
+    try:
+        with urllib.request.urlopen(req, timeout=FORWARD_TIMEOUT) as resp:
+            return resp.status, resp.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+    except (urllib.error.URLError, OSError) as e:
+        # Unreachable backends leave the ring after the next failed health check
+        threading.Thread(target=check_backend, args=(url,), daemon=True).start()
+        return 502, json.dumps({'success': False, 'error': f'Backend {url} unavailable: {e}'}).encode()
+
+
+@app.route('/health', methods=['GET'])
+def health():
+    """Health check endpoint"""
+    with backends_lock:
+        healthy = sum(1 for b in backends.values() if b['healthy'])
+        total = len(backends)
+    return jsonify({
+        'success': True,
+        'status': 'running',
+        'mode': 'router',
+        'backends': total,
+        'healthy_backends': healthy,
+        'timestamp': datetime.now().isoformat()
+    }), 200 if healthy else 503
+
+
+@app.route('/router/backends', methods=['GET'])
+@require_api_key
+def list_backends():
+    """List backends and their health"""
+    with backends_lock:
+        backends_list = [{'url': url, **backend} for url, backend in backends.items()]
+    return jsonify({'success': True, 'backends': backends_list, 'count': len(backends_list)})
+
+
+@app.route('/router/backends', methods=['POST'])
+@require_api_key
+def create_backend():
+    """Add a backend instance"""
+    data = request.json or {}
+    url = data.get('url')
+    if not url:
+        return jsonify({'success': False, 'error': 'url is required'}), 400
+
+    url = add_backend(url)
+    check_backend(url)
+    with backends_lock:
+        backend = dict(backends[url])
+    return jsonify({'success': True, 'message': 'Backend added', 'backend': {'url': url, **backend}})
+
+
+@app.route('/router/backends/remove', methods=['POST'])
+@require_api_key
+def delete_backend():
+    """Remove a backend instance"""
+    data = request.json or {}
+    url = data.get('url')
+    if not url:
+        return jsonify({'success': False, 'error': 'url is required'}), 400
+
+    if not remove_backend(url):
+        return jsonify({'success': False, 'error': f'Backend {url} not found'}), 404
+    return jsonify({'success': True, 'message': 'Backend removed'})
+
+
+@app.route('/router/route', methods=['GET'])
+@require_api_key
+def route_lookup():
+    """Show which backend owns a connection id"""
+    connection_id = get_connection_id(None)
+    if not connection_id:
+        return jsonify({'success': False, 'error': 'connection_id is required'}), 400
+    return jsonify({'success': True, 'connection_id': connection_id, 'backend': get_backend(connection_id)})
+
+
+@app.route('/batch', methods=['POST'])
+@require_api_key
+def batch():
+    """Run several requests, split per shard and forwarded concurrently.
+
+    Body: {"requests": [{"connection_id", "method", "path", "body"}, ...]}
+    Items may give account and server instead of connection_id (also inside body).
+    Results are returned in request order.
+    """
+    data = request.json
+    if not data or not isinstance(data.get('requests'), list):
+        return jsonify({'success': False, 'error': 'requests list is required'}), 400
+
+    results = [None] * len(data['requests'])
+    items = {}
+    shards = {}
+    for i, item in enumerate(data['requests']):
+        if not isinstance(item, dict):
+            results[i] = {'status': 400, 'response': {'success': False, 'error': 'Request must be an object'}}
+            continue
+
+        method = str(item.get('method', 'GET')).upper()
+        path = item.get('path')
+        connection_id = connection_id_from(item) or connection_id_from(item.get('body'))
+        if method not in ('GET', 'POST'):
+            error = 'method must be GET or POST'
+        elif not isinstance(path, str) or not path.strip('/'):
+            error = 'path is required'
+        elif not connection_id:
+            error = 'connection_id is required (connection_id, or account and server)'
+        else:
+            error = None
+        if error:
+            results[i] = {'status': 400, 'response': {'success': False, 'error': error}}
+            continue
+
+        backend = get_backend(connection_id)
+        if backend is None:
+            results[i] = {'status': 503, 'response': {'success': False, 'error': 'No healthy backend'}}
+            continue
+
+        items[i] = (connection_id, method, '/' + path.lstrip('/'), item.get('body'))
+        shards.setdefault(backend, []).append(i)
+
+    def run_shard(url, indexes):
+        # Requests for one shard run in order, since they share one terminal session
+        for i in indexes:
+            connection_id, method, path, body = items[i]
+            status, payload = forward(url, connection_id, method, path,
+                                      body=json.dumps(body).encode() if body is not None else None)
+            try:
+                response = json.loads(payload)
+            except ValueError:
+                response = {'success': False, 'error': payload.decode(errors='replace')}
+            results[i] = {'status': status, 'backend': url, 'response': response}
+
+    list(executor.map(lambda shard: run_shard(*shard), shards.items()))
+
+    return jsonify({'success': True, 'results': results, 'count': len(results)})
+
+
+@app.route('/<path:path>', methods=['GET', 'POST'])
+@require_api_key
+def proxy(path):
+    """Forward any other request to the backend owning its connection id"""
+    data = request.get_json(silent=True)
+    connection_id = get_connection_id(data)
+    if not connection_id:
+        return jsonify({
+            'success': False,
+            'error': 'connection_id is required (X-Connection-Id header, connection_id, or account and server)'
+        }), 400
+
+    url = get_backend(connection_id)
+    if url is None:
+        return jsonify({'success': False, 'error': 'No healthy backend'}), 503
+
+    status, payload = forward(url, connection_id, request.method, f'/{path}', request.query_string.decode(),
+                              request.get_data() if request.method == 'POST' else None)
+    return Response(payload, status=status, mimetype='application/json',
+                    headers={'X-MT5-Backend': url})
+
+
+def start_router():
+    """Register configured backends and start health checking"""
+    for url in filter(None, os.getenv('MT5_ROUTER_BACKENDS', '').split(',')):
+        add_backend(url.strip())
+    threading.Thread(target=run_health_checks, name='health-checks', daemon=True).start()
+
+
+if __name__ == '__main__':
+    port = int(os.getenv('MT5_ROUTER_PORT', 5100))
+    debug = os.getenv('MT5_SERVICE_DEBUG', 'false').lower() == 'true'
+
+    print(f"""
+╔══════════════════════════════════════════════════════════╗
+║            MT5 Service Router Starting                   ║
+╠══════════════════════════════════════════════════════════╣
+║  Port: {port}                                              ║
+║  Backends: {os.getenv('MT5_ROUTER_BACKENDS', '')}
+║                                                          ║
+║  Endpoints:                                              ║
+║    GET  /health                  - Router health         ║
+║    GET  /router/backends         - List backends         ║
+║    POST /router/backends         - Add backend           ║
+║    POST /router/backends/remove  - Remove backend        ║
+║    GET  /router/route            - Lookup owner backend  ║
+║    POST /batch                   - Batch, split by shard ║
+║    *    /<path>                  - Forward by account    ║
+╚══════════════════════════════════════════════════════════╝
+    """)
+
+    start_router()
+    app.run(host='0.0.0.0', port=port, debug=debug, threaded=True)
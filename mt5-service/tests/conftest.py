@@ -0,0 +1,5 @@
+import os
+import sys
+
+# app.py and router.py are run as scripts from mt5-service/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,205 @@
+"""
+Router tests: consistent-hash ownership, rebalancing and /batch splitting,
+plus an end-to-end run against two simulator-backed app.py instances.
+
+Run from mt5-service/: python -m pytest tests
+"""
+
+import importlib.util
+import json
+import os
+import threading
+
+import pytest
+from werkzeug.serving import make_server
+
+import router
+
+HEADERS = {'X-API-Key': router.API_KEY}
+CONNECTION_IDS = [f'{login}@Demo-Server' for login in range(10000, 12000)]
+
+
+@pytest.fixture(autouse=True)
+def empty_router(monkeypatch):
+    """Each test starts with no backends and an empty ring"""
+    monkeypatch.setattr(router, 'backends', {})
+    monkeypatch.setattr(router, 'ring', ([], []))
+
+
+def set_healthy(*urls, healthy=True):
+    with router.backends_lock:
+        for url in urls:
+            router.backends[url] = {'healthy': healthy, 'failures': 0, 'last_check': None, 'last_error': None}
+        router.rebuild_ring()
+
+
+def owners():
+    return {connection_id: router.get_backend(connection_id) for connection_id in CONNECTION_IDS}
+
+
+def test_empty_ring_has_no_owner():
+    assert router.get_backend('1@Demo') is None
+    set_healthy('http://a', healthy=False)
+    assert router.get_backend('1@Demo') is None
+
+
+def test_ring_ownership_is_stable_and_spread():
+    set_healthy('http://a', 'http://b', 'http://c')
+    before = owners()
+    assert before == owners()
+
+    counts = {url: list(before.values()).count(url) for url in ('http://a', 'http://b', 'http://c')}
+    assert sum(counts.values()) == len(CONNECTION_IDS)
+    assert all(count > len(CONNECTION_IDS) * 0.2 for count in counts.values()), counts
+
+
+def test_unhealthy_backend_owns_nothing():
+    set_healthy('http://a', 'http://b')
+    set_healthy('http://c', healthy=False)
+    assert set(owners().values()) == {'http://a', 'http://b'}
+
+
+def test_remove_moves_only_departing_backend_keys():
+    set_healthy('http://a', 'http://b', 'http://c')
+    before = owners()
+    assert router.remove_backend('http://b')
+    after = owners()
+
+    moved = {cid for cid in CONNECTION_IDS if before[cid] != after[cid]}
+    assert moved == {cid for cid in CONNECTION_IDS if before[cid] == 'http://b'}
+    assert 'http://b' not in after.values()
+
+
+def test_add_takes_keys_only_for_new_backend():
+    set_healthy('http://a', 'http://b', 'http://c')
+    before = owners()
+    set_healthy('http://d')
+    after = owners()
+
+    moved = {cid for cid in CONNECTION_IDS if before[cid] != after[cid]}
+    assert moved
+    assert all(after[cid] == 'http://d' for cid in moved)
+    assert moved == {cid for cid in CONNECTION_IDS if after[cid] == 'http://d'}
+
+
+def test_batch_splits_per_shard(monkeypatch):
+    set_healthy('http://a', 'http://b', 'http://c')
+    calls = []
+    lock = threading.Lock()
+
+    def fake_forward(url, connection_id, method, path, query=None, body=None):
+        with lock:
+            calls.append((url, connection_id, method, path, body))
+        return 200, json.dumps({'success': True, 'connection_id': connection_id, 'path': path}).encode()
+
+    monkeypatch.setattr(router, 'forward', fake_forward)
+
+    items = [
+        {'connection_id': CONNECTION_IDS[i], 'method': 'get', 'path': 'account'} for i in range(12)
+    ] + [
+        {'account': '20003', 'server': 'Demo-Server', 'method': 'POST', 'path': '/rules',
+         'body': {'ticket': 1, 'trailing_distance': 50}},
+        {'method': 'POST', 'path': '/trade/open', 'body': {'account': '20004', 'server': 'Demo-Server'}},
+        {'connection_id': CONNECTION_IDS[0], 'method': 'DELETE', 'path': '/account'},
+        {'connection_id': CONNECTION_IDS[0], 'path': '/'},
+        {'path': '/account'},
+        'not an object',
+    ]
+    resp = router.app.test_client().post('/batch', json={'requests': items}, headers=HEADERS)
+    assert resp.status_code == 200
+    results = resp.get_json()['results']
+    assert len(results) == len(items)
+
+    # Valid items reach the owning backend, in request order, with normalized paths
+    for i in range(12):
+        assert results[i]['status'] == 200
+        assert results[i]['backend'] == router.get_backend(CONNECTION_IDS[i])
+        assert results[i]['response'] == {'success': True, 'connection_id': CONNECTION_IDS[i], 'path': '/account'}
+    assert results[12]['backend'] == router.get_backend('20003@Demo-Server')
+    assert results[13]['response']['connection_id'] == '20004@Demo-Server'
+
+    # Invalid items are answered by the router and never forwarded
+    assert [r['status'] for r in results[14:]] == [400] * 4
+    assert len(calls) == 14
+
+    # More than one shard was used, and each shard saw its requests in order
+    shards = {}
+    for url, connection_id, *_ in calls:
+        shards.setdefault(url, []).append(connection_id)
+    assert len(shards) > 1
+    for url, seen in shards.items():
+        expected = [r['response']['connection_id'] for r in results[:14] if r['backend'] == url]
+        assert seen == expected
+
+    assert calls[[c[1] for c in calls].index('20003@Demo-Server')][4] == json.dumps(items[12]['body']).encode()
+
+
+def test_batch_without_healthy_backend(monkeypatch):
+    monkeypatch.setattr(router, 'forward', lambda *args, **kwargs: pytest.fail('forwarded'))
+    resp = router.app.test_client().post(
+        '/batch', json={'requests': [{'connection_id': '1@Demo', 'path': '/account'}]}, headers=HEADERS)
+    assert resp.get_json()['results'][0]['status'] == 503
+
+
+def load_backend(name, tmp_path, monkeypatch):
+    """Load a separate app.py instance driving its own simulated terminal"""
+    monkeypatch.setenv('MT5_SIMULATOR', '1')
+    monkeypatch.setenv('MT5_STATE_FILE', str(tmp_path / f'{name}.json'))
+    monkeypatch.delenv('MT5_ACCOUNT', raising=False)
+    path = os.path.join(os.path.dirname(router.__file__), 'app.py')
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.readiness['started_at'] = 'now'
+    module.warm_up()
+
+    server = make_server('127.0.0.1', 0, module.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return module, server
+
+
+def test_routes_accounts_to_simulator_backends(tmp_path, monkeypatch):
+    servers = []
+    try:
+        for name in ('backend_a', 'backend_b'):
+            module, server = load_backend(name, tmp_path, monkeypatch)
+            assert module.readiness['ready']
+            servers.append(server)
+        urls = [f'http://127.0.0.1:{s.server_port}' for s in servers]
+
+        for url in urls:
+            router.add_backend(url)
+            router.check_backend(url)
+        assert {b['healthy'] for b in router.backends.values()} == {True}
+
+        # Pick one account per backend
+        accounts = {}
+        for connection_id in CONNECTION_IDS:
+            accounts.setdefault(router.get_backend(connection_id), connection_id)
+        assert set(accounts) == set(urls)
+
+        client = router.app.test_client()
+        for url, connection_id in accounts.items():
+            login, server = connection_id.split('@')
+            resp = client.post('/login', json={'account': login, 'password': 'x', 'server': server},
+                               headers=HEADERS)
+            assert resp.status_code == 200
+            assert resp.headers['X-MT5-Backend'] == url
+
+            resp = client.get('/account', headers={**HEADERS, 'X-Connection-Id': connection_id})
+            assert resp.get_json()['account']['login'] == int(login)
+
+        # A backend refuses requests for an account its terminal is not logged into
+        url_a, url_b = urls
+        status, payload = router.forward(url_a, accounts[url_b], 'GET', '/account')
+        assert status == 409
+
+        resp = client.post('/batch', headers=HEADERS, json={'requests': [
+            {'connection_id': connection_id, 'path': '/positions'} for connection_id in accounts.values()
+        ]})
+        results = resp.get_json()['results']
+        assert [r['status'] for r in results] == [200, 200]
+        assert [r['backend'] for r in results] == list(accounts)
+    finally:
+        for server in servers:
+            server.shutdown()